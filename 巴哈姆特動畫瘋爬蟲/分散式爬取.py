@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import multiprocessing
+
+# --- 多進程 / 多台電腦一起爬 ---
+# 單一 Python 程式就算開執行緒，BeautifulSoup 解析時還是會被 GIL 卡住，只能用到一顆核心。
+# 這裡改成「工作佇列」：協調者把列表頁、內頁網址丟進 SQLite 檔，
+# 開好幾個 worker 進程 (甚至別台電腦也可以連同一個檔案) 各自領工作、爬、解析、寫回結果。
+#
+# 佇列的規則：
+# 1. 去重複：同一個網址只會進佇列一次 (url 是 UNIQUE)
+# 2. 租約 (lease)：worker 領工作時會寫上「誰領的、幾點到期」，
+#    worker 當掉的話租約過期，別的 worker 會自動把工作撿回來重做
+# 3. 重試上限：同一個工作失敗 MAX_ATTEMPTS 次就標成 failed，不再重試
+# 4. 速度限制 (兩層)，避免開越多核心對巴哈的負擔越大、被鎖：
+#    - 每個 worker 自己：兩個請求之間至少隔 WORKER_INTERVAL 秒 (跟單機版的休息時間差不多)
+#    - 所有 worker (不管幾個進程、幾台電腦) 合計：每 MIN_INTERVAL 秒最多一個請求，
+#      透過佇列資料庫裡的 rate_limit 排隊
+#    爬蟲大部分時間都在等網路回應，多開 worker 就是讓好幾個請求同時在等，
+#    所以速度大約會跟 worker 數成正比，直到碰到合計上限 (預設 1 / 0.25 = 每秒 4 個請求，
+#    剛好是 MAX_DEFAULT_WORKERS 個 worker 的量)。
+#    想用更多核心或更多台電腦加速，要同時把 --interval 調小，否則多出來的 worker 只會排隊等
+#
+# 注意：多台電腦共用同一個佇列檔時
+# - 一定要加 --shared。本機預設用 WAL 模式 (比較快)，但 WAL 要靠共享記憶體，
+#   只能在同一台電腦上用；放在網路磁碟 (SMB、NFS 都一樣) 會讀到舊資料甚至弄壞資料庫。
+#   --shared 會改用傳統的 DELETE 日誌模式
+# - 就算用 --shared，SQLite 官方也提醒網路磁碟的檔案鎖不一定可靠，
+#   建議只在區網、少量 worker 的情況下使用
+# - 速度限制用各台電腦的時鐘計算，電腦之間的時間要先校正好
+
+from 巴哈姆特動畫瘋爬蟲 import console, get_anime_details, fetch_list_page, save_results
+
+base_dir = os.path.abspath(os.path.dirname(__file__))
+QUEUE_FILE = os.path.join(base_dir, "crawl_queue.db")
+
+LEASE_SECONDS = 60   # 一個工作最多給 60 秒，超過就當作 worker 掛了
+MAX_ATTEMPTS = 3     # 每個工作最多嘗試幾次
+IDLE_SLEEP = 1.0     # 暫時領不到工作時等幾秒再問
+WORKER_INTERVAL = 1.0    # 每個 worker 自己兩個請求之間至少隔幾秒
+MIN_INTERVAL = 0.25      # 所有 worker 合計，兩個請求之間至少隔幾秒
+MAX_DEFAULT_WORKERS = 4  # 沒指定 --workers 時最多開幾個進程 (= WORKER_INTERVAL / MIN_INTERVAL，再多也只會排隊)
+SCHEMA_VERSION = 1
+
+LIST_PAGE_URL = "https://ani.gamer.com.tw/animeList.php?page={page}"
+
+
+def open_queue(path=QUEUE_FILE, shared=False):
+    """
+    打開 (或建立) 佇列資料庫
+    每個進程都要自己開一個連線，sqlite 連線不能跨進程共用
+    shared: 佇列檔放在網路磁碟、給多台電腦共用時設 True (不能用 WAL)
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)  # 自己控制交易
+    if shared:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    else:
+        conn.execute("PRAGMA journal_mode=WAL")  # 讀寫可以同時進行，多個 worker 比較不會互卡
+
+    # 建表放在同一個交易裡，避免好幾個 worker 同時打開新檔案時互相干擾
+    conn.execute("BEGIN IMMEDIATE")
+
+    # 舊版的佇列檔欄位不一樣，直接重建 (佇列本來就是暫存的)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        conn.execute("DROP TABLE IF EXISTS jobs")
+        conn.execute("DROP TABLE IF EXISTS results")
+        conn.execute("DROP TABLE IF EXISTS rate_limit")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind        TEXT NOT NULL,            -- 'list' 列表頁 / 'detail' 內頁
+            url         TEXT NOT NULL UNIQUE,     -- 去重複用
+            payload     TEXT NOT NULL,            -- JSON，工作需要的參數
+            status      TEXT NOT NULL DEFAULT 'pending',  -- pending / leased / done / failed
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_until REAL,
+            error       TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            url      TEXT PRIMARY KEY,   -- 同一部動畫重做也只會留一筆
+            page     INTEGER NOT NULL,   -- 列表第幾頁、頁內第幾個，輸出時照這個排序，
+            position INTEGER NOT NULL,   -- 跟單機版的順序一樣
+            row      TEXT NOT NULL       -- JSON，跟 anime_data.xlsx 的一列一樣
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rate_limit (
+            id      INTEGER PRIMARY KEY CHECK (id = 1),  -- 只有一列
+            next_at REAL NOT NULL                        -- 下一個請求最早可以發出的時間
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO rate_limit (id, next_at) VALUES (1, 0)")
+    conn.execute("COMMIT")
+    return conn
+
+
+def reset_queue(conn):
+    """
+    清空佇列，開始新的一輪爬取
+    """
+    conn.execute("DELETE FROM jobs")
+    conn.execute("DELETE FROM results")
+
+
+def enqueue(conn, kind, url, payload):
+    """
+    加入工作，網址重複的話直接忽略 (去重複)
+    回傳是否真的有加進去
+    """
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO jobs (kind, url, payload) VALUES (?, ?, ?)",
+        (kind, url, json.dumps(payload, ensure_ascii=False)),
+    )
+    return cur.rowcount == 1
+
+
+def claim_job(conn, worker_id, lease_seconds=LEASE_SECONDS):
+    """
+    領一個工作：pending 的，或是租約已經過期 (原本的 worker 掛了) 的
+    回傳 (id, kind, url, payload)，沒有工作可領就回傳 None
+    """
+    now = time.time()
+    # BEGIN IMMEDIATE 會先拿到寫入鎖，確保兩個 worker 不會領到同一個工作
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # 過期又已經用完重試次數的，直接判定失敗
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired' "
+            "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, MAX_ATTEMPTS),
+        )
+        row = conn.execute(
+            "SELECT id, kind, url, payload FROM jobs "
+            "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+            "ORDER BY kind = 'detail', id LIMIT 1",  # 列表頁優先，才能盡早把內頁工作展開
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        conn.execute(
+            "UPDATE jobs SET status = 'leased', attempts = attempts + 1, "
+            "lease_owner = ?, lease_until = ? WHERE id = ?",
+            (worker_id, now + lease_seconds, row[0]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    job_id, kind, url, payload = row
+    return job_id, kind, url, json.loads(payload)
+
+
+def _finish_job(conn, job_id, worker_id):
+    # 只有租約還在自己手上才算數；租約過期被別人撿走的話，以對方為準
+    cur = conn.execute(
+        "UPDATE jobs SET status = 'done', lease_owner = NULL, lease_until = NULL "
+        "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+        (job_id, worker_id),
+    )
+    return cur.rowcount == 1
+
+
+def fail_job(conn, job_id, worker_id, error):
+    """
+    工作失敗：還有重試次數就放回 pending，否則標成 failed
+    """
+    conn.execute(
+        "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "lease_owner = NULL, lease_until = NULL, error = ? "
+        "WHERE id = ? AND lease_owner = ?",
+        (MAX_ATTEMPTS, str(error), job_id, worker_id),
+    )
+
+
+def wait_for_slot(conn, min_interval=MIN_INTERVAL):
+    """
+    共用速度限制：跟資料庫預約下一個可以發請求的時間，時間到了才回傳
+    所有 worker 都透過同一列 rate_limit 排隊，合計每 min_interval 秒最多一個請求
+    回傳後要馬上發請求，中間不要再另外休息，否則好幾個 worker 的請求又會擠在一起
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()
+        next_at = conn.execute("SELECT next_at FROM rate_limit WHERE id = 1").fetchone()[0]
+        slot = max(now, next_at)
+        conn.execute("UPDATE rate_limit SET next_at = ? WHERE id = 1", (slot + min_interval,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def has_claimable_job(conn):
+    # 只是先看一眼有沒有工作，避免閒著的 worker 白白佔掉速度限制的名額
+    row = conn.execute(
+        "SELECT 1 FROM jobs WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) LIMIT 1",
+        (time.time(),),
+    ).fetchone()
+    return row is not None
+
+
+def count_unfinished_jobs(conn):
+    row = conn.execute(
+        "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')"
+    ).fetchone()
+    return row[0]
+
+
+def has_unfinished_jobs(conn):
+    return count_unfinished_jobs(conn) > 0
+
+
+def _run_list_job(conn, job_id, worker_id, payload):
+    page = payload["page"]
+    items = fetch_list_page(page)
+    if items is None:
+        raise RuntimeError(f"第 {page} 頁連線失敗")
+
+    # 展開內頁工作 + 標記完成放在同一個交易裡，中途當掉就整個重來，不會漏
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if _finish_job(conn, job_id, worker_id):
+            for position, item in enumerate(items):
+                enqueue(conn, "detail", item["連結"], dict(item, page=page, position=position))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    console.print(f"[bold cyan]--- 第 {page} 頁：找到 {len(items)} 部動畫 ---[/bold cyan]")
+
+
+def _run_detail_job(conn, job_id, worker_id, url, payload):
+    # raise_errors=True: 連線失敗會丟例外，讓 run_worker 把工作放回佇列重試，而不是存成 0 分
+    # delay=False: 已經在 run_worker 排過時間了，不要再自己休息
+    real_score, real_status, tags_str = get_anime_details(
+        url, payload["年份"], raise_errors=True, delay=False
+    )
+    row = {
+        "動畫名稱": payload["動畫名稱"],
+        "觀看次數": payload["觀看次數"],
+        "年份": payload["年份"],
+        "狀態": real_status,
+        "評分": real_score,
+        "主題標籤": tags_str,
+    }
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if _finish_job(conn, job_id, worker_id):
+            conn.execute(
+                "INSERT OR REPLACE INTO results (url, page, position, row) VALUES (?, ?, ?, ?)",
+                (url, payload["page"], payload["position"], json.dumps(row, ensure_ascii=False)),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    console.print(f"  > [{worker_id}] 完成: [yellow]{row['動畫名稱']}[/yellow] ({row['年份']})")
+
+
+def run_worker(path=QUEUE_FILE, worker_id=None, shared=False, min_interval=MIN_INTERVAL):
+    """
+    worker 主迴圈：一直領工作直到佇列裡沒有未完成的工作
+    別台電腦也可以直接執行: python 分散式爬取.py worker --shared --db 共享路徑/crawl_queue.db
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    conn = open_queue(path, shared)
+    last_request = 0.0
+
+    try:
+        while True:
+            if not has_claimable_job(conn):
+                # 沒工作可領，但別人手上還有 (可能會展開更多內頁，或是會過期被撿回來)，等一下再問
+                if has_unfinished_jobs(conn):
+                    time.sleep(IDLE_SLEEP)
+                    continue
+                break
+
+            # 先排好發請求的時間，輪到了才領工作，
+            # 這樣租約是從真正開始爬才起算，不會在排隊時就過期被別人撿走
+            wait = last_request + WORKER_INTERVAL - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            wait_for_slot(conn, min_interval)
+
+            job = claim_job(conn, worker_id)
+            if job is None:
+                continue  # 剛好被別的 worker 搶走了
+
+            last_request = time.time()
+            job_id, kind, url, payload = job
+            try:
+                if kind == "list":
+                    _run_list_job(conn, job_id, worker_id, payload)
+                else:
+                    _run_detail_job(conn, job_id, worker_id, url, payload)
+            except Exception as e:
+                print(f"[{worker_id}] 工作失敗 {url}: {e}")
+                fail_job(conn, job_id, worker_id, e)
+    finally:
+        conn.close()
+
+
+def collect_results(path=QUEUE_FILE, shared=False):
+    """
+    讀出所有 worker 寫回的資料 (list of dict，跟 get_anime_data_v3 的回傳一樣，照列表頁順序)
+    還有工作沒做完 (worker 中途全掛了) 就回傳 None，避免用不完整的資料蓋掉 anime_data.xlsx
+    """
+    conn = open_queue(path, shared)
+    try:
+        rows = conn.execute("SELECT row FROM results ORDER BY page, position").fetchall()
+        failed = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'failed'").fetchone()[0]
+        unfinished = count_unfinished_jobs(conn)
+    finally:
+        conn.close()
+
+    if unfinished:
+        console.print(f"[bold red]❌ 還有 {unfinished} 個工作沒做完，這次不存檔 "
+                      f"(請用 --resume 重新執行，接著把剩下的做完)[/bold red]")
+        return None
+    if failed:
+        console.print(f"[bold red]⚠️ 有 {failed} 個工作重試 {MAX_ATTEMPTS} 次仍失敗，已略過[/bold red]")
+    return [json.loads(r[0]) for r in rows]
+
+
+def start_crawl(max_pages=11, workers=None, path=QUEUE_FILE, resume=False,
+                shared=False, min_interval=MIN_INTERVAL):
+    """
+    協調者：把列表頁丟進佇列、開 workers 個進程一起爬，全部做完後回傳資料 (沒做完回傳 None)
+    workers: 預設 = CPU 核心數，但最多 MAX_DEFAULT_WORKERS 個
+    resume=True 代表接著上次沒做完的佇列繼續 (不清空)
+    shared / min_interval: 見檔案開頭的說明
+    """
+    workers = workers or min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+
+    conn = open_queue(path, shared)
+    try:
+        if not resume:
+            reset_queue(conn)
+        for page in range(1, max_pages + 1):
+            enqueue(conn, "list", LIST_PAGE_URL.format(page=page), {"page": page})
+    finally:
+        conn.close()
+
+    console.print(f"[bold green]🚀 開 {workers} 個 worker 進程開始爬取 {max_pages} 頁...[/bold green]")
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(path, None, shared, min_interval))
+        for _ in range(workers)
+    ]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    crashed = [p for p in processes if p.exitcode != 0]
+    if crashed:
+        console.print(f"[bold red]⚠️ 有 {len(crashed)} 個 worker 異常結束 "
+                      f"(exitcode: {[p.exitcode for p in crashed]})[/bold red]")
+
+    return collect_results(path, shared)
+
+
+# --- 執行 ---
+# 本機多進程:       python 分散式爬取.py --pages 11 --workers 8
+# 多台電腦共用:      python 分散式爬取.py --shared --db 共享路徑/crawl_queue.db
+# 別台電腦加入幫忙:  python 分散式爬取.py worker --shared --db 共享路徑/crawl_queue.db
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="巴哈姆特動畫瘋 多進程爬蟲")
+    parser.add_argument("mode", nargs="?", default="crawl", choices=["crawl", "worker"])
+    parser.add_argument("--db", default=QUEUE_FILE, help="佇列資料庫路徑")
+    parser.add_argument("--pages", type=int, default=11, help="要爬幾頁列表")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"本機要開幾個進程 (預設 = CPU 核心數，最多 {MAX_DEFAULT_WORKERS})")
+    parser.add_argument("--shared", action="store_true",
+                        help="佇列檔放在網路磁碟給多台電腦共用 (不使用 WAL)，所有電腦都要加")
+    parser.add_argument("--interval", type=float, default=MIN_INTERVAL,
+                        help=f"所有 worker 合計，兩個請求之間至少隔幾秒 (每個 worker 自己另外至少隔 {WORKER_INTERVAL} 秒)")
+    parser.add_argument("--resume", action="store_true", help="接著上次沒做完的佇列繼續")
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        run_worker(args.db, shared=args.shared, min_interval=args.interval)
+        sys.exit(0)
+
+    data = start_crawl(max_pages=args.pages, workers=args.workers, path=args.db, resume=args.resume,
+                       shared=args.shared, min_interval=args.interval)
+    if data is None:
+        sys.exit(1)
+    save_results(data)
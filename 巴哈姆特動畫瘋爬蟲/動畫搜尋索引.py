@@ -0,0 +1,459 @@
+import os
+import json
+import heapq
+from bisect import bisect_left, bisect_right, insort
+
+# --- 動畫搜尋索引 (倒排索引) ---
+# 把爬下來的「動畫名稱」切成 CJK n-gram、「主題標籤」逐一拆開，
+# 各自建立「關鍵字 -> 動畫編號」的對照表，查詢時只要查表取交集，
+# 不用每次都把整張表掃一遍，資料量再大也能在毫秒內回應。
+
+base_dir = os.path.abspath(os.path.dirname(__file__))
+DATA_FILE = os.path.join(base_dir, "anime_data.xlsx")
+
+
+def index_path_for(data_file):
+    """
+    索引檔一律放在資料檔旁邊: anime_data.xlsx -> anime_data_index.json
+    """
+    return os.path.splitext(data_file)[0] + "_index.json"
+
+
+INDEX_FILE = index_path_for(DATA_FILE)
+
+# 題材分類規則：欄位名稱 -> 只要「動畫名稱」包含其中一個關鍵字就算
+# (只看名稱、不看主題標籤，跟原本 '異世界' in title 的判斷結果一樣，圖表數字不會變)
+# 以後想多加題材 (例如 "是否戀愛")，在這裡加一行就好，不用改爬蟲
+GENRE_RULES = {
+    "是否異世界": ["異世界", "轉生"],
+}
+
+
+def new_index():
+    """
+    建立一個空的索引
+    """
+    return {
+        "next_id": 0,
+        "docs": {},         # 編號 -> 該部動畫的欄位
+        "title_ids": {},    # 動畫名稱 -> 編號 (增量更新時用來找舊資料)
+        "grams": {},        # 名稱 n-gram -> 編號集合
+        "tags": {},         # 主題標籤 -> 編號集合
+        "years": {},        # 年份 -> 編號集合
+        # 以下兩個排序好的清單只放在記憶體，讀檔時重建
+        "by_views": [],     # (-觀看次數, 編號)，由大到小，取 top-k 用
+        "by_score": [],     # (評分, 編號)，由小到大，評分範圍查詢用
+    }
+
+
+def _normalize(text):
+    # 英文統一轉小寫、拿掉空白，讓 "Re:從零" 跟 "re:從零" 查得到同一部
+    return "".join(str(text).lower().split())
+
+
+def _title_grams(title):
+    """
+    把名稱切成 1-gram + 2-gram
+    中文沒有空白可以斷詞，用 n-gram 是最簡單又不會漏掉的做法
+    """
+    text = _normalize(title)
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _is_number(value):
+    # NaN 跟自己不相等，Excel 的空格讀進來就是 NaN，要排除
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def _views_key(doc, doc_id):
+    views = doc.get("觀看次數")
+    return (-views if _is_number(views) else 0, doc_id)
+
+
+def _score_key(doc, doc_id):
+    score = doc.get("評分")
+    return (score, doc_id) if _is_number(score) else None
+
+
+def _remove_sorted(lst, key):
+    i = bisect_left(lst, key)
+    if i < len(lst) and lst[i] == key:
+        del lst[i]
+
+
+def _split_tags(tags_str):
+    if not isinstance(tags_str, str):
+        return []
+    return [t.strip() for t in tags_str.split(",") if t.strip()]
+
+
+def _add_posting(table, key, doc_id):
+    table.setdefault(key, set()).add(doc_id)
+
+
+def _remove_posting(table, key, doc_id):
+    ids = table.get(key)
+    if ids is None:
+        return
+    ids.discard(doc_id)
+    if not ids:
+        del table[key]
+
+
+def _doc_keys(doc):
+    # 一部動畫在三張對照表中各自對應到哪些 key
+    return _title_grams(doc["動畫名稱"]), _split_tags(doc.get("主題標籤")), doc.get("年份")
+
+
+def _add_doc(index, doc_id, doc):
+    grams, tags, year = _doc_keys(doc)
+    for gram in grams:
+        _add_posting(index["grams"], gram, doc_id)
+    for tag in tags:
+        _add_posting(index["tags"], tag, doc_id)
+    if isinstance(year, int):
+        _add_posting(index["years"], year, doc_id)
+    index["docs"][doc_id] = doc
+    index["title_ids"][doc["動畫名稱"]] = doc_id
+    insort(index["by_views"], _views_key(doc, doc_id))
+    score_key = _score_key(doc, doc_id)
+    if score_key is not None:
+        insort(index["by_score"], score_key)
+
+
+def _remove_doc(index, doc_id):
+    doc = index["docs"].pop(doc_id)
+    grams, tags, year = _doc_keys(doc)
+    for gram in grams:
+        _remove_posting(index["grams"], gram, doc_id)
+    for tag in tags:
+        _remove_posting(index["tags"], tag, doc_id)
+    if isinstance(year, int):
+        _remove_posting(index["years"], year, doc_id)
+    del index["title_ids"][doc["動畫名稱"]]
+    _remove_sorted(index["by_views"], _views_key(doc, doc_id))
+    score_key = _score_key(doc, doc_id)
+    if score_key is not None:
+        _remove_sorted(index["by_score"], score_key)
+
+
+def update_index(index, records, remove_missing=True):
+    """
+    增量更新：只重建「新出現」或「內容有變」的動畫，沒變的直接跳過
+    records: 爬蟲回傳的 list of dict (跟 anime_data.xlsx 的欄位一樣)
+    remove_missing: 這次沒爬到的舊動畫要不要從索引拿掉 (預設跟 Excel 保持一致)
+    回傳 (新增, 更新, 刪除) 的數量
+    """
+    added = updated = removed = 0
+    seen = set()
+
+    for record in records:
+        title = record.get("動畫名稱")
+        if not title:
+            continue
+        seen.add(title)
+        doc = dict(record)
+
+        doc_id = index["title_ids"].get(title)
+        if doc_id is not None:
+            if index["docs"][doc_id] == doc:
+                continue
+            _remove_doc(index, doc_id)
+            updated += 1
+        else:
+            doc_id = index["next_id"]
+            index["next_id"] += 1
+            added += 1
+
+        _add_doc(index, doc_id, doc)
+
+    if remove_missing:
+        for title in list(index["title_ids"]):
+            if title not in seen:
+                _remove_doc(index, index["title_ids"][title])
+                removed += 1
+
+    return added, updated, removed
+
+
+def load_index(path=INDEX_FILE):
+    """
+    讀取索引檔，找不到或壞掉就回傳空索引 (下次爬蟲會重新建起來)
+    """
+    index = new_index()
+    if not os.path.exists(path):
+        return index
+
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            raw = json.load(f)
+        except json.JSONDecodeError:
+            print(f"索引檔損毀，將重新建立: {path}")
+            return index
+
+    # JSON 的 key 一定是字串，讀回來要轉回整數編號 / 集合
+    index["next_id"] = raw["next_id"]
+    index["docs"] = {int(k): v for k, v in raw["docs"].items()}
+    index["title_ids"] = {doc["動畫名稱"]: doc_id for doc_id, doc in index["docs"].items()}
+    index["grams"] = {k: set(v) for k, v in raw["grams"].items()}
+    index["tags"] = {k: set(v) for k, v in raw["tags"].items()}
+    index["years"] = {int(k): set(v) for k, v in raw["years"].items()}
+    index["by_views"] = sorted(_views_key(doc, i) for i, doc in index["docs"].items())
+    index["by_score"] = sorted(
+        k for k in (_score_key(doc, i) for i, doc in index["docs"].items()) if k is not None
+    )
+    return index
+
+
+def save_index(index, path=INDEX_FILE):
+    raw = {
+        "next_id": index["next_id"],
+        "docs": index["docs"],
+        "grams": {k: sorted(v) for k, v in index["grams"].items()},
+        "tags": {k: sorted(v) for k, v in index["tags"].items()},
+        "years": {k: sorted(v) for k, v in index["years"].items()},
+    }
+    # 先寫暫存檔再取代，避免存到一半當掉把舊索引弄壞
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(raw, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _keyword_ids(index, keyword):
+    """
+    名稱關鍵字查詢：取所有 2-gram 的交集，再確認真的是子字串 (排除順序不對的誤判)
+    """
+    text = _normalize(keyword)
+    if not text:
+        return set(index["docs"])
+
+    if len(text) == 1:
+        grams = [text]
+    else:
+        grams = [text[i:i + 2] for i in range(len(text) - 1)]
+
+    # 從最短的集合開始取交集，速度最快
+    postings = sorted((index["grams"].get(g, set()) for g in grams), key=len)
+    ids = set(postings[0])
+    for p in postings[1:]:
+        ids &= p
+        if not ids:
+            return ids
+
+    if len(text) <= 2:
+        return ids
+    return {i for i in ids if text in _normalize(index["docs"][i]["動畫名稱"])}
+
+
+def _in_range(value, low, high):
+    if not _is_number(value):
+        return False
+    if low is not None and value < low:
+        return False
+    if high is not None and value > high:
+        return False
+    return True
+
+
+def _score_slice(index, low, high):
+    """
+    用 bisect 在 by_score 上找出評分範圍的起訖位置，O(log n)
+    """
+    by_score = index["by_score"]
+    lo = 0 if low is None else bisect_left(by_score, (low, -1))
+    hi = len(by_score) if high is None else bisect_right(by_score, (high, float("inf")))
+    return lo, max(lo, hi)
+
+
+def _walk_is_cheaper(total, matched, top_k):
+    """
+    兩種取 top-k 的方法選比較快的：
+    1. 照 by_views 由大到小一路往下走，大約要走 top_k * total / matched 筆才湊得滿
+    2. 把符合的 matched 筆全部拿出來，再用 heapq 挑前 top_k 名
+    """
+    if top_k is None or matched == 0:
+        return False
+    return top_k * total / matched < matched
+
+
+def search(index, keyword=None, tags_all=None, tags_any=None, tags_not=None,
+           year_min=None, year_max=None, score_min=None, score_max=None, top_k=10):
+    """
+    查詢動畫 (所有條件之間是 AND)
+    keyword:  名稱包含的文字，例如 "轉生"
+    tags_all: 一定要有的標籤 (全部都要有)
+    tags_any: 有其中一個就好的標籤
+    tags_not: 不能有的標籤
+    year_min / year_max, score_min / score_max: 範圍 (包含邊界)
+    top_k: 依觀看次數取前幾名，None 代表全部
+    回傳 list of dict，已依觀看次數由大到小排好
+    """
+    docs = index["docs"]
+    total = len(docs)
+
+    # 先把每個條件轉成「編號集合」，最後一起取交集
+    candidate_sets = []
+
+    if keyword:
+        candidate_sets.append(_keyword_ids(index, keyword))
+
+    for tag in tags_all or []:
+        candidate_sets.append(index["tags"].get(tag, set()))
+
+    if tags_any:
+        any_ids = set()
+        for tag in tags_any:
+            any_ids |= index["tags"].get(tag, set())
+        candidate_sets.append(any_ids)
+
+    # 年份、評分範圍可能涵蓋大半資料，展開成集合很花時間
+    # 先算出會命中幾筆 (不用展開)，只有在它最挑、又不適合直接照觀看數往下走時才展開，
+    # 否則留到最後逐筆檢查
+    has_year = year_min is not None or year_max is not None
+    has_score = score_min is not None or score_max is not None
+
+    def _worth_expanding(size):
+        smallest = min((len(c) for c in candidate_sets), default=total)
+        return size < smallest and not _walk_is_cheaper(total, size, top_k)
+
+    if has_year:
+        years = [y for y in index["years"] if _in_range(y, year_min, year_max)]
+        if _worth_expanding(sum(len(index["years"][y]) for y in years)):
+            year_ids = set()
+            for y in years:
+                year_ids |= index["years"][y]
+            candidate_sets.append(year_ids)
+            has_year = False
+
+    if has_score:
+        lo, hi = _score_slice(index, score_min, score_max)
+        if _worth_expanding(hi - lo):
+            candidate_sets.append({doc_id for _, doc_id in index["by_score"][lo:hi]})
+            has_score = False
+
+    # 集合之間先取交集 (從最小的開始，成本只跟最小的集合有關)，才知道實際命中幾筆
+    ids = None  # None 代表「沒有限制」，不用真的建一個全部編號的集合
+    if candidate_sets:
+        candidate_sets.sort(key=len)
+        ids = set(candidate_sets[0])
+        for c in candidate_sets[1:]:
+            ids &= c
+
+    excluded = [index["tags"][tag] for tag in tags_not or [] if tag in index["tags"]]
+
+    def accept(doc_id):
+        if ids is not None and doc_id not in ids:
+            return False
+        for c in excluded:
+            if doc_id in c:
+                return False
+        doc = docs[doc_id]
+        if has_year and not _in_range(doc.get("年份"), year_min, year_max):
+            return False
+        return not has_score or _in_range(doc.get("評分"), score_min, score_max)
+
+    if ids is None or _walk_is_cheaper(total, len(ids), top_k):
+        # 照觀看數由大到小走，湊滿 top_k 筆就停
+        results = []
+        for _, doc_id in index["by_views"]:
+            if top_k is not None and len(results) >= top_k:
+                break
+            if accept(doc_id):
+                results.append(docs[doc_id])
+        return results
+
+    # 條件很挑：直接逐筆檢查命中的集合，再用 heapq 挑前 top_k 名
+    keys = [_views_key(docs[i], i) for i in ids if accept(i)]
+    if top_k is None:
+        keys.sort()
+    else:
+        keys = heapq.nsmallest(top_k, keys)
+    return [docs[doc_id] for _, doc_id in keys]
+
+
+def match_any(index, keywords):
+    """
+    回傳「名稱」包含任一關鍵字的動畫名稱集合 (題材分類用)
+    """
+    ids = set()
+    for word in keywords:
+        ids |= _keyword_ids(index, word)
+    return {index["docs"][i]["動畫名稱"] for i in ids}
+
+
+def classify_genres(index, records, rules=GENRE_RULES):
+    """
+    依 GENRE_RULES 用索引查表，幫每筆資料填上 "是" / "否" 題材欄位
+    """
+    for column, keywords in rules.items():
+        hits = match_any(index, keywords)
+        for record in records:
+            record[column] = "是" if record.get("動畫名稱") in hits else "否"
+    return records
+
+
+def run_search_server(path=INDEX_FILE, port=8001):
+    """
+    (選用) 啟動 Flask 查詢 API，例如:
+    http://127.0.0.1:8001/api/search?q=轉生&tags=奇幻,冒險&year_min=2020&top_k=5
+    top_k 沒給預設 10 筆，top_k=all 回傳全部符合的結果
+    """
+    from flask import Flask, request, jsonify  # 只有要開 API 才需要安裝 Flask
+
+    app = Flask(__name__)
+    index = load_index(path)
+
+    def _list_arg(name):
+        value = request.args.get(name, "")
+        return [v for v in value.split(",") if v] or None
+
+    def _num_arg(name, cast):
+        value = request.args.get(name)
+        return cast(value) if value not in (None, "") else None
+
+    def _top_k_arg():
+        value = request.args.get("top_k")
+        if value in (None, ""):
+            return 10
+        if value == "all":
+            return None
+        top_k = int(value)
+        if top_k < 0:
+            raise ValueError("top_k 不能是負數")
+        return top_k
+
+    @app.route('/api/search', methods=['GET'])
+    def api_search():
+        try:
+            results = search(
+                index,
+                keyword=request.args.get("q"),
+                tags_all=_list_arg("tags"),
+                tags_any=_list_arg("tags_any"),
+                tags_not=_list_arg("tags_not"),
+                year_min=_num_arg("year_min", int),
+                year_max=_num_arg("year_max", int),
+                score_min=_num_arg("score_min", float),
+                score_max=_num_arg("score_max", float),
+                top_k=_top_k_arg(),
+            )
+            return jsonify(results)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+    @app.route('/api/reload', methods=['POST'])
+    def api_reload():
+        # 爬蟲重新跑完之後，呼叫這個讓 API 讀到最新索引
+        nonlocal index
+        index = load_index(path)
+        return jsonify({"status": "success", "count": len(index["docs"])})
+
+    print(f"👉 查詢 API: http://127.0.0.1:{port}/api/search?q=轉生")
+    app.run(debug=True, port=port)
+
+
+if __name__ == "__main__":
+    run_search_server()
@@ -11,6 +11,9 @@ from rich.console import Console
 from rich.table import Table
 from rich import box  # 用來設定表格邊框樣式
 
+# 搜尋索引：題材分類改用索引查表 (見 動畫搜尋索引.py)
+from 動畫搜尋索引 import load_index, update_index, save_index, classify_genres, index_path_for, DATA_FILE
+
 # 初始化 Rich 的控制台
 console = Console()
 
@@ -73,9 +76,12 @@ def get_status_by_date(soup, year):
         return "連載中" # 發生錯誤時的預設值
     
 
-def get_anime_details(link, year):
+def get_anime_details(link, year, raise_errors=False, delay=True):
     """
     爬取巴哈姆特動畫瘋的列表資料
+    raise_errors: 連線失敗時直接丟出例外，而不是回傳預設值
+                  (多進程版 分散式爬取.py 需要知道失敗，才能把工作放回佇列重試)
+    delay: 送出請求前先隨機休息一下；多進程版由佇列統一排時間，要設 False
     """
     url = "https://ani.gamer.com.tw/animeList.php?sort=2" # sort=1 代表依年份排序 # sort=2 代表依月人氣排序(我要的,才能抓到以前的神作)
     
@@ -87,10 +93,13 @@ def get_anime_details(link, year):
     
     try:
         # 隨機休息 0.5 ~ 1.5 秒，模擬人類點擊，避免被鎖
-        time.sleep(random.uniform(0.5, 1.5)) 
+        if delay:
+            time.sleep(random.uniform(0.5, 1.5)) 
         res = requests.get(link, headers=headers, timeout=10)
         if res.status_code != 200:
-            return 0.0
+            if raise_errors:
+                raise RuntimeError(f"HTTP {res.status_code}")
+            return 0.0, "連載中", ""
         
         soup = BeautifulSoup(res.text, "html.parser")
         
@@ -138,67 +147,93 @@ def get_anime_details(link, year):
         return score, real_status, tags_str
             
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"內頁錯誤: {e}")
-        return 0.0, "連載中"
+        return 0.0, "連載中", ""
 
-def get_anime_data_v3(max_pages=11):
+def fetch_list_page(page):
     """
-    升級版：支援翻頁 + 內頁爬取
-    max_pages: 想要爬幾頁 (建議先設 5 頁測試，正式報告可以設 10 或 20)
+    抓取列表的第 page 頁，回傳這頁每部動畫的基本資料 (名稱、觀看數、年份、內頁連結)
+    連線失敗回傳 None
+    (單機版 get_anime_data_v3 跟多進程版 分散式爬取.py 共用這段)
     """
     base_url = "https://ani.gamer.com.tw/animeList.php?sort=2"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
     }
 
+    # sort=2 代表依人氣排序 (累積觀看數)，這樣比較容易抓到舊的神作
+    url = f"{base_url}?sort=1&page={page}"
+    
+    response = requests.get(url, headers=headers, timeout=10)
+    if response.status_code != 200:
+        print(f"第 {page} 頁連線失敗")
+        return None
+
+    soup = BeautifulSoup(response.text, "html.parser")
+    anime_items = soup.find_all("a", class_="theme-list-main") 
+
+    items = []
+    for item in anime_items:
+        title = item.find("p", class_="theme-name").text.strip()
+        view_count_str = item.find("div", class_="show-view-number").find("p").text.strip()
+        info_text = item.find("p", class_="theme-time").text.strip()
+        
+        # 取得內頁連結 (href)
+        href = item.get('href')
+        full_link = f"https://ani.gamer.com.tw/{href}"
+        
+        # 1. 處理觀看數
+        if "萬" in view_count_str:
+            view_count = int(float(view_count_str.replace("萬", "")) * 10000)
+        elif view_count_str.isdigit():
+            view_count = int(view_count_str)
+        else:
+            view_count = 0
+            
+        # 處理年份 (修正後)
+        # 原始寫法: re.search(r'^\d{4}', info_text) -> 錯誤，因為開頭是中文
+        year_match = re.search(r'\d{4}', info_text)  # ✅ 修正：拿掉 ^
+        
+        if year_match:
+            year = int(year_match.group())
+        else:
+            # 為了除錯，建議這裡可以把抓不到的字印出來看看長怎樣
+            print(f" [Debug] 抓不到年份，原始文字是: {info_text}") 
+            year = "未知"
+
+        items.append({
+            "動畫名稱": title,
+            "觀看次數": view_count,
+            "年份": year,
+            "連結": full_link,
+        })
+
+    return items
+
+def get_anime_data_v3(max_pages=11):
+    """
+    升級版：支援翻頁 + 內頁爬取
+    max_pages: 想要爬幾頁 (建議先設 5 頁測試，正式報告可以設 10 或 20)
+    """
     all_data = []
 
     for page in range(1, max_pages + 1):
         # 使用 console.print 可以印出有顏色的字
         console.print(f"[bold cyan]--- 正在爬取第 {page} 頁 ---[/bold cyan]")
-        # sort=2 代表依人氣排序 (累積觀看數)，這樣比較容易抓到舊的神作
-        url = f"{base_url}?sort=1&page={page}"
-        
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"第 {page} 頁連線失敗")
+
+        items = fetch_list_page(page)
+        if items is None:
             continue
 
-        soup = BeautifulSoup(response.text, "html.parser")
-        anime_items = soup.find_all("a", class_="theme-list-main") 
+        print(f"  > 本頁找到 {len(items)} 部動畫，開始進入內頁抓評分...")
 
-        print(f"  > 本頁找到 {len(anime_items)} 部動畫，開始進入內頁抓評分...")
-
-        for item in anime_items:
-            title = item.find("p", class_="theme-name").text.strip()
-            view_count_str = item.find("div", class_="show-view-number").find("p").text.strip()
-            info_text = item.find("p", class_="theme-time").text.strip()
-            
-            # 取得內頁連結 (href)
-            href = item.get('href')
-            full_link = f"https://ani.gamer.com.tw/{href}"
-            
-            # 1. 處理觀看數
-            if "萬" in view_count_str:
-                view_count = int(float(view_count_str.replace("萬", "")) * 10000)
-            elif view_count_str.isdigit():
-                view_count = int(view_count_str)
-            else:
-                view_count = 0
-                
-            # 處理年份 (修正後)
-            # 原始寫法: re.search(r'^\d{4}', info_text) -> 錯誤，因為開頭是中文
-            year_match = re.search(r'\d{4}', info_text)  # ✅ 修正：拿掉 ^
-            
-            if year_match:
-                year = int(year_match.group())
-            else:
-                # 為了除錯，建議這裡可以把抓不到的字印出來看看長怎樣
-                print(f" [Debug] 抓不到年份，原始文字是: {info_text}") 
-                year = "未知"
-
-            # 處理題材
-            is_isekai = "是" if ('異世界' in title or '轉生' in title) else "否"
+        for item in items:
+            title = item["動畫名稱"]
+            view_count = item["觀看次數"]
+            year = item["年份"]
+            full_link = item["連結"]
 
             # 【進入內頁】同時抓評分 + 判斷狀態
             # 簡化輸出，讓畫面乾淨一點
@@ -215,7 +250,6 @@ def get_anime_data_v3(max_pages=11):
                 "觀看次數": view_count,
                 "年份": year,
                 "狀態": real_status, # 使用新的時間判斷結果
-                "是否異世界": is_isekai,
                 "評分": real_score, # 這是真實的了！
                 "主題標籤": tags_str  # 新增這一欄
             })
@@ -302,19 +336,25 @@ def print_rich_table(df):
 
     console.print(table)
 
-# --- 執行爬蟲並存檔 ---
-if __name__ == "__main__":
-    
-    console.print("[bold green]🚀 爬蟲啟動中...[/bold green]")
-
-    # 設定要爬幾頁？建議先設 5 頁試跑，確認沒問題後再改成 10 或 20 頁抓更多資料
-    # 5 頁大約需要 2-3 分鐘 (因為要進內頁)
-    data = get_anime_data_v3(max_pages=11) 
+# --- 存檔 + 更新索引 + 印出表格 (單機版、多進程版共用) ---
+def save_results(data, output_file=DATA_FILE):
+    """
+    把爬到的資料更新進搜尋索引、判斷題材，存成 Excel，最後印出 Rich 表格
+    output_file: 預設固定存在這支程式的資料夾 (不管從哪裡執行)，
+                 查詢 API (動畫搜尋索引.py) 才讀得到同一份索引
+    """
+    # 更新搜尋索引 (增量：只重建有變動的動畫)，再用索引判斷題材 (是否異世界...)
+    # 索引檔跟 Excel 放在一起，例如 anime_data.xlsx -> anime_data_index.json
+    index_file = index_path_for(output_file)
+    index = load_index(index_file)
+    added, updated, removed = update_index(index, data)
+    save_index(index, index_file)
+    classify_genres(index, data)
+    console.print(f"[bold green]🔎 索引已更新：新增 {added}、更新 {updated}、移除 {removed} 部[/bold green]")
     
     df = pd.DataFrame(data)
 
     # 1. 存檔
-    output_file = "anime_data.xlsx"
     df.to_excel(output_file, index=False)
     
     print("\n" + "="*50)
@@ -324,4 +364,16 @@ if __name__ == "__main__":
         df_sorted = df.sort_values(by="觀看次數", ascending=False).reset_index(drop=True)
         print_rich_table(df_sorted)
     else:
-        console.print("[bold red]❌ 沒有抓到任何資料！[/bold red]")
\ No newline at end of file
+        console.print("[bold red]❌ 沒有抓到任何資料！[/bold red]")
+
+# --- 執行爬蟲並存檔 ---
+if __name__ == "__main__":
+    
+    console.print("[bold green]🚀 爬蟲啟動中...[/bold green]")
+
+    # 設定要爬幾頁？建議先設 5 頁試跑，確認沒問題後再改成 10 或 20 頁抓更多資料
+    # 5 頁大約需要 2-3 分鐘 (因為要進內頁)
+    # 想用多核心加速，改跑 分散式爬取.py
+    data = get_anime_data_v3(max_pages=11) 
+
+    save_results(data)